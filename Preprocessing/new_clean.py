@@ -1,6 +1,9 @@
 # file: data_cleaning.py
+import gc
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import pyarrow.csv as pacsv
 
 # === SETUP ===
 BASE_DIR = r""
@@ -12,7 +15,7 @@ os.makedirs(CLEAN_DIR, exist_ok=True)
 print(f"📂 Loading CSV files from: {DATA_DIR}")
 print(f"🧹 Cleaned files will be saved to: {CLEAN_DIR}\n")
 
-# === LOAD ALL TABLES ===
+# === TABLES ===
 tables = {
     "customers": "olist_customers_dataset.csv",
     "geolocation": "olist_geolocation_dataset.csv",
@@ -25,44 +28,70 @@ tables = {
     "product_category_translation": "product_category_name_translation.csv",
 }
 
-dfs = {}
-for name, fname in tables.items():
-    path = os.path.join(DATA_DIR, fname)
-    if not os.path.exists(path):
-        print(f"⚠️ Warning: {fname} not found.")
-        continue
-    dfs[name] = pd.read_csv(path)
-    print(f"✅ Loaded {name}: {dfs[name].shape[0]} rows, {dfs[name].shape[1]} columns")
+# ============================================================
+# 🪶 MEMORY: NARROW DTYPES RIGHT AFTER LOADING
+# ============================================================
+def shrink(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast numerics and turn low-cardinality strings into categories.
+    Join keys (*_id, *_zip_code_prefix) are left as loaded."""
+    for col in df.columns:
+        if col.endswith("_id") or col.endswith("zip_code_prefix"):
+            continue
+        s = df[col]
+        if pd.api.types.is_integer_dtype(s):
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            down = pd.to_numeric(s, downcast="float")
+            if down.astype(s.dtype).equals(s):  # lossless only (keeps lat/lng precision)
+                df[col] = down
+        elif pd.api.types.is_string_dtype(s) and s.nunique() < 0.5 * len(s):
+            df[col] = s.astype("category")
+    return df
+
 
 # ============================================================
 # 🧼 LIGHT CLEANING STEPS — REMOVE DUPLICATES, FIX DATES ONLY
 # ============================================================
 
 # === 1. GEOLOCATION: Drop exact duplicate rows (considering all columns) ===
-if "geolocation" in dfs:
-    before = dfs["geolocation"].shape[0]
-    dfs["geolocation"] = dfs["geolocation"].drop_duplicates()  # all columns checked
-    after = dfs["geolocation"].shape[0]
+def clean_geolocation(geo: pd.DataFrame) -> pd.DataFrame:
+    before = geo.shape[0]
+    # hash int category codes instead of Python strings (no-op if shrink() already did it)
+    geo["geolocation_city"] = geo["geolocation_city"].astype("category")
+    geo["geolocation_state"] = geo["geolocation_state"].astype("category")
+    geo = geo.drop_duplicates(ignore_index=True)  # all columns checked
+    after = geo.shape[0]
     removed = before - after
     print(f"🌍 Geolocation: removed {removed} exact duplicate rows across all columns.")
+    return geo
 
-# === 2. ORDERS: Convert date columns to datetime ===
-if "orders" in dfs:
-    date_cols = [
+
+# === 2. DATES: Convert timestamp columns to datetime ===
+# Olist timestamps are all "YYYY-MM-DD HH:MM:SS"; a fixed format skips per-value inference
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+date_cols = {
+    "orders": [
         "order_purchase_timestamp",
         "order_approved_at",
         "order_delivered_carrier_date",
         "order_delivered_customer_date",
         "order_estimated_delivery_date",
-    ]
-    for col in date_cols:
-        if col in dfs["orders"].columns:
-            dfs["orders"][col] = pd.to_datetime(dfs["orders"][col], errors="coerce")
-    print("🕒 Orders: converted timestamp columns to datetime objects.")
+    ],
+    "order_items": ["shipping_limit_date"],
+    "order_reviews": ["review_creation_date", "review_answer_timestamp"],
+}
+
+
+def parse_dates(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    for col in date_cols[name]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors="coerce", cache=True)
+    print(f"🕒 {name}: converted timestamp columns to datetime objects.")
+    return df
+
 
 # === 3. TRANSLATIONS: Add 2 missing category translations (optional small fix) ===
-if "product_category_translation" in dfs:
-    trans = dfs["product_category_translation"]
+def add_missing_translations(trans: pd.DataFrame) -> pd.DataFrame:
     missing_rows = pd.DataFrame(
         {
             "product_category_name": [
@@ -76,16 +105,57 @@ if "product_category_translation" in dfs:
         }
     )
     trans = pd.concat([trans, missing_rows], ignore_index=True)
-    dfs["product_category_translation"] = trans
     print("🈶 Added 2 missing product category translations.")
+    return trans
+
+
+clean_dispatch = {
+    "geolocation": clean_geolocation,
+    "orders": lambda df: parse_dates("orders", df),
+    "order_items": lambda df: parse_dates("order_items", df),
+    "order_reviews": lambda df: parse_dates("order_reviews", df),
+    "product_category_translation": add_missing_translations,
+}
 
 # ============================================================
-# 💾 SAVE CLEANED FILES
+# 💾 LOAD → CLEAN → SAVE, ONE PIPELINE PER TABLE
 # ============================================================
-for name, df in dfs.items():
-    save_path = os.path.join(CLEAN_DIR, tables[name])
-    df.to_csv(save_path, index=False)
+# Tables never need to coexist; each worker holds one table at a time, so peak
+# memory is bounded by MAX_WORKERS tables. More workers finish sooner (the pyarrow
+# parser releases the GIL) but let the big tables (reviews, items, geolocation) sit in
+# memory together, undoing the one-table-at-a-time bound. Keep it small; 1 = sequential.
+MAX_WORKERS = max(1, int(os.getenv("CLEAN_MAX_WORKERS", "2")))
+
+
+def process_table(name: str, fname: str):
+    path = os.path.join(DATA_DIR, fname)
+    if not os.path.exists(path):
+        print(f"⚠️ Warning: {fname} not found.")
+        return
+    # pd.read_csv(engine="pyarrow") cannot parse the CRLFs inside quoted review comments
+    # strings_can_be_null: empty fields stay NaN/null as with pd.read_csv, not ""
+    table = pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    df = shrink(table.to_pandas(types_mapper=pd.ArrowDtype))
+    print(f"✅ Loaded {name}: {df.shape[0]} rows, {df.shape[1]} columns")
+
+    if name in clean_dispatch:
+        df = clean_dispatch[name](df)
+
+    save_path = os.path.join(CLEAN_DIR, fname.replace(".csv", ".parquet"))
+    df.to_parquet(save_path, engine="pyarrow", compression="zstd", index=False)
     print(f"💾 Saved cleaned {name} → {save_path}")
+    del df
+    gc.collect()
+
+
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+    futures = [ex.submit(process_table, name, fname) for name, fname in tables.items()]
+    for fut in futures:
+        fut.result()  # re-raise worker errors
 
-print("\n✅ Light data cleaning complete! All cleaned CSVs are saved in:")
+print("\n✅ Light data cleaning complete! All cleaned Parquet files are saved in:")
 print(CLEAN_DIR)
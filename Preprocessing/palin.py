@@ -1,6 +1,9 @@
 # file: data_quality_check.py
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 # ✅ Absolute path to your dataset directory
 DATA_DIR = r""
@@ -22,17 +25,53 @@ tables = {
     "product_category_translation": "product_category_name_translation.csv",
 }
 
+# Key columns read explicitly as strings so the parser skips inferring them
+KEY_COLUMNS = {
+    "customers": ["customer_id", "customer_unique_id"],
+    "orders": ["order_id", "customer_id"],
+    "order_items": ["order_id", "product_id", "seller_id"],
+    "order_payments": ["order_id"],
+    "order_reviews": ["review_id", "order_id"],
+    "products": ["product_id", "product_category_name"],
+    "sellers": ["seller_id"],
+    "product_category_translation": ["product_category_name"],
+}
+
+
+def load(name: str, fname: str):
+    path = os.path.join(DATA_DIR, fname)
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    if os.path.exists(parquet_path):
+        # cleaned output of new_clean.py: typed columns, no CSV re-parse
+        return pd.read_parquet(parquet_path, engine="pyarrow", dtype_backend="pyarrow")
+    if os.path.exists(path):
+        # quoted review comments contain CRLFs, which pd.read_csv(engine="pyarrow") rejects
+        key_types = {c: pa.string() for c in KEY_COLUMNS.get(name, [])}
+        table = pacsv.read_csv(
+            path,
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            # empty fields must stay null or the missing-value checks report 0
+            convert_options=pacsv.ConvertOptions(column_types=key_types, strings_can_be_null=True),
+        )
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return None
+
+
 dfs = {}
 print(f"Loading CSVs from: {DATA_DIR}\n")
 
-for name, fname in tables.items():
-    path = os.path.join(DATA_DIR, fname)
-    if not os.path.exists(path):
-        print(f"⚠️ Warning: {fname} not found in {DATA_DIR}")
+# files are independent and the pyarrow parser releases the GIL -> load them in parallel
+with ThreadPoolExecutor(max_workers=min(len(tables), os.cpu_count() or 1)) as ex:
+    futures = {name: ex.submit(load, name, fname) for name, fname in tables.items()}
+
+for name, fut in futures.items():
+    df = fut.result()
+    if df is None:
+        print(f"⚠️ Warning: {tables[name]} not found in {DATA_DIR}")
         continue
-    dfs[name] = pd.read_csv(path)
-    print(f"✅ Loaded {name}: {dfs[name].shape[0]} rows, {dfs[name].shape[1]} columns")
-    print(f"   Columns: {list(dfs[name].columns)}\n")
+    dfs[name] = df
+    print(f"✅ Loaded {name}: {df.shape[0]} rows, {df.shape[1]} columns")
+    print(f"   Columns: {list(df.columns)}\n")
 
 # ==================== Data Quality Checks ====================
 
@@ -48,7 +87,8 @@ for name, df in dfs.items():
 
 print("\n=== 🔁 Duplicate Rows by Table ===")
 for name, df in dfs.items():
-    dup_count = df.duplicated().sum()
+    # one 64-bit hash per row (vectorized), then a single-column duplicated on uint64
+    dup_count = int(pd.util.hash_pandas_object(df, index=False).duplicated().sum())
     print(f"📄 Table {name}: {dup_count} duplicate rows.")
 
 print("\n=== 🧮 Data Type Summary for Key Tables ===")
@@ -61,7 +101,9 @@ print("\n=== ⚙️ Example Inconsistencies: Products ↔ Category Translation =
 if "products" in dfs and "product_category_translation" in dfs:
     prod = dfs["products"]
     trans = dfs["product_category_translation"]
-    missing_cats = set(prod["product_category_name"].dropna().unique()) - set(trans["product_category_name"].dropna().unique())
+    # ~73 names: hash the small side once and probe only the distinct product categories
+    trans_set = frozenset(trans["product_category_name"].dropna().tolist())
+    missing_cats = {x for x in prod["product_category_name"].dropna().unique() if x not in trans_set}
     if len(missing_cats) == 0:
         print("✅ All product categories have translations.")
     else:
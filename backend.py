@@ -5,118 +5,84 @@ and conversational memory management.
 """
 
 import os
+import hashlib
+import sqlite3
+import threading
+import time
 import uuid
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import google.generativeai as genai
-from typing import Dict, List, Optional, Tuple, Any
+from google.generativeai import caching
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Any
+import numpy as np
 import json
 import re
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
 from conversation_memory import ConversationMemory
 
 from dotenv import load_dotenv
 load_dotenv()
-class DatabaseConnection:
-    """Handles MySQL database connection and operations."""
-    
-    def __init__(self, host: str = "localhost", port: int = 3306, 
-                 database: str = "olist_db", user: str = "root", 
-                 password: str = ""):
-        """
-        Initialize database connection parameters.
-        
-        Args:
-            host: MySQL host
-            port: MySQL port
-            database: Database name
-            user: MySQL username
-            password: MySQL password
-        """
-        self.host = host
-        self.port = port
-        self.database = database
-        self.user = user
-        self.password = password
-        self.connection = None
-    
-    def connect(self) -> bool:
-        """
-        Establish connection to MySQL database.
-        
-        Returns:
-            bool: True if connection successful, False otherwise
-        """
-        try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password
-            )
-            if self.connection.is_connected():
-                return True
-        except Error as e:
-            print(f"Error connecting to MySQL: {e}")
-            return False
-        return False
-    
-    def disconnect(self):
-        """Close database connection."""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-    
-    def execute_query(self, query: str) -> Tuple[Optional[List[Dict]], Optional[str]]:
-        """
-        Execute SQL query and return results.
-        
-        Args:
-            query: SQL query string
-            
-        Returns:
-            Tuple of (results, error_message)
-            results: List of dictionaries containing query results
-            error_message: Error message if query fails
-        """
-        if not self.connection or not self.connection.is_connected():
-            if not self.connect():
-                return None, "Database connection failed"
-        
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query)
-            
-            # Check if query is SELECT (has results) or INSERT/UPDATE/DELETE
-            if query.strip().upper().startswith('SELECT'):
-                results = cursor.fetchall()
-                # Convert datetime and other non-serializable objects to strings
-                for row in results:
-                    for key, value in row.items():
-                        if hasattr(value, 'isoformat'):  # datetime objects
-                            row[key] = value.isoformat()
-                        elif not isinstance(value, (str, int, float, bool, type(None))):
-                            row[key] = str(value)
-                return results, None
-            else:
-                self.connection.commit()
-                return [{"affected_rows": cursor.rowcount}], None
-                
-        except Error as e:
-            return None, str(e)
-        finally:
-            if cursor:
-                cursor.close()
-    
-    def get_schema_info(self) -> str:
-        """
-        Get database schema information for LLM context.
-        
-        Returns:
-            str: Formatted schema information
-        """
-        schema_info = """
+
+
+def _json_default(value: Any) -> str:
+    """Driver values JSON lacks: DECIMAL -> exact digit string, DATETIME/DATE -> ISO 8601."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_dumps(obj: Any) -> str:
+    """Compact JSON (orjson when installed); non-JSON values fall back to str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+# Rows fetched per round-trip when streaming a result set
+STREAM_BATCH_SIZE = 1000
+# How long a query waits for a free pooled connection before failing
+POOL_CHECKOUT_TIMEOUT = 30
+
+# Markdown code fences (```sql / ```) the LLM sometimes wraps around generated SQL
+_CODE_FENCE = re.compile(r'```(?:sql)?\n?', re.IGNORECASE)
+
+# Longest string cell sent to the LLM for analysis (caps prompt tokens)
+MAX_ANALYSIS_CELL_CHARS = 200
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+# Lifetime of the server-side cached SQL prompt prefix (schema + rules)
+SQL_PROMPT_CACHE_TTL = timedelta(hours=1)
+# Generated SQL/analysis responses kept in process; older ones stay on disk only
+LLM_CACHE_MAX_ENTRIES = 512
+
+_SQL_INSTRUCTIONS = """You are a SQL query generator for a MySQL database. 
+Given the following database schema and a natural language question, generate ONLY a valid MySQL SQL query."""
+
+_SQL_RULES = """Rules:
+1. Generate ONLY the SQL query, no explanations or markdown formatting
+2. Use proper JOINs when needed
+3. Use appropriate WHERE clauses for filtering
+4. Use aggregate functions (COUNT, SUM, AVG, etc.) when appropriate
+5. Handle NULL values properly
+6. Use proper table and column names from the schema
+7. Return only SELECT queries (read-only operations)
+8. Do not include any text before or after the SQL query
+9. If the query requires grouping, use GROUP BY appropriately
+10. Use LIMIT if the user asks for top N or limited results
+
+If relevant, incorporate the insights provided in the conversation context."""
+
+# Static schema description sent to the LLM (built once at import, not per call)
+_SCHEMA_INFO = """
 Database Schema for olist_db:
 
 1. customers
@@ -191,37 +157,349 @@ Database Schema for olist_db:
    - review_creation_date (DATETIME)
    - review_answer_timestamp (DATETIME)
 """
-        return schema_info
+
+class RowBatches:
+    """
+    Iterator over an open cursor's rows in batches.
+
+    Owns the cursor and its pooled connection; both are released when the rows
+    run out or on close(), which is safe to call at any point (even before the
+    first batch) and more than once.
+    """
+
+    def __init__(self, connection, cursor, batch_size: int, release):
+        self._connection = connection
+        self._cursor = cursor
+        self._batch_size = batch_size
+        self._release = release
+
+    def __iter__(self) -> "RowBatches":
+        return self
+
+    def __next__(self) -> List[Dict]:
+        if self._cursor is None:
+            raise StopIteration
+        try:
+            batch = self._cursor.fetchmany(self._batch_size) if self._cursor.with_rows else []
+        except Exception:
+            self.close()
+            raise
+        if not batch:
+            self.close()
+            raise StopIteration
+        return batch
+
+    def close(self):
+        cursor, connection = self._cursor, self._connection
+        self._cursor = self._connection = None
+        if cursor is not None:
+            try:
+                cursor.close()
+            finally:
+                self._release(connection)
+
+
+class DatabaseConnection:
+    """Handles MySQL database connection and operations."""
+    
+    def __init__(self, host: str = "localhost", port: int = 3306, 
+                 database: str = "olist_db", user: str = "root", 
+                 password: str = "", pool_size: int = 8):
+        """
+        Initialize database connection parameters.
+        
+        Args:
+            host: MySQL host
+            port: MySQL port
+            database: Database name
+            user: MySQL username
+            password: MySQL password
+            pool_size: Number of pooled connections shared by concurrent queries
+        """
+        self.host = host
+        self.port = port
+        self.database = database
+        self.user = user
+        self.password = password
+        self.pool_size = pool_size
+        self.pool = None
+        # MySQLConnectionPool fails instead of waiting when empty; callers queue here instead
+        self._available = threading.BoundedSemaphore(pool_size)
+    
+    def connect(self) -> bool:
+        """
+        Create the MySQL connection pool (opens pool_size connections).
+        
+        Returns:
+            bool: True if connection successful, False otherwise
+        """
+        try:
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name="olist",
+                pool_size=self.pool_size,
+                host=self.host,
+                port=self.port,
+                database=self.database,
+                user=self.user,
+                password=self.password,
+                # C extension builds datetime/Decimal natively; no converter_class, which
+                # would switch it to raw rows decoded cell by cell in Python
+                use_pure=False,
+                # a stream closed early leaves unread rows; drain them instead of erroring
+                consume_results=True
+            )
+            return True
+        except Error as e:
+            print(f"Error connecting to MySQL: {e}")
+            self.pool = None
+            return False
+    
+    def disconnect(self):
+        """Close idle pooled connections."""
+        if self.pool:
+            self.pool._remove_connections()
+            self.pool = None
+    
+    def _checkout(self):
+        """Wait (up to POOL_CHECKOUT_TIMEOUT) for a free pooled connection."""
+        if not self._available.acquire(timeout=POOL_CHECKOUT_TIMEOUT):
+            raise Error(msg="Timed out waiting for a free database connection")
+        try:
+            # the pool reconnects stale connections on checkout
+            return self.pool.get_connection()
+        except BaseException:
+            self._available.release()
+            raise
+
+    def _release(self, connection):
+        """Return a connection from _checkout to the pool."""
+        try:
+            connection.close()
+        finally:
+            self._available.release()
+
+    def execute_query(
+        self, query: str, params: Optional[Sequence[Any]] = None
+    ) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """
+        Execute SQL query and return results.
+        
+        Args:
+            query: SQL query string (use %s placeholders when passing params)
+            params: Values bound to the placeholders by the driver, never concatenated into the SQL
+            
+        Returns:
+            Tuple of (results, error_message)
+            results: List of dictionaries containing query results
+            error_message: Error message if query fails
+        """
+        if not self.pool:
+            if not self.connect():
+                return None, "Database connection failed"
+        
+        connection = None
+        cursor = None
+        try:
+            connection = self._checkout()
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            cursor.execute(query, params)
+            
+            # Check if query returned rows (SELECT) or was INSERT/UPDATE/DELETE
+            if cursor.with_rows:
+                return cursor.fetchall(), None
+            else:
+                connection.commit()
+                return [{"affected_rows": cursor.rowcount}], None
+                
+        except Error as e:
+            return None, str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                self._release(connection)
+
+    def iter_query(
+        self,
+        query: str,
+        params: Optional[Sequence[Any]] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Tuple[Optional[Iterator[List[Dict]]], Optional[str]]:
+        """
+        Execute a SELECT and stream its rows in batches instead of buffering the whole result.
+        
+        Args:
+            query: SQL query string (use %s placeholders when passing params)
+            params: Values bound to the placeholders by the driver
+            batch_size: Rows fetched from the server per batch
+            
+        Returns:
+            Tuple of (batches, error_message)
+            batches: RowBatches iterator of row-dictionary lists; holds a pooled connection
+                until exhausted or closed (callers must close() it if they stop early)
+            error_message: Error message if the query fails to execute
+        """
+        if not self.pool:
+            if not self.connect():
+                return None, "Database connection failed"
+        
+        connection = None
+        cursor = None
+        try:
+            connection = self._checkout()
+            # unbuffered: rows stay on the server until fetched
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params)
+        except Error as e:
+            if cursor:
+                cursor.close()
+            if connection:
+                self._release(connection)
+            return None, str(e)
+        return RowBatches(connection, cursor, batch_size, self._release), None
+    
+    def get_schema_info(self) -> str:
+        """
+        Get database schema information for LLM context.
+        
+        Returns:
+            str: Formatted schema information
+        """
+        return _SCHEMA_INFO
+
+
+class LLMResponseCache:
+    """Caches LLM responses by prompt hash: in-process LRU backed by a SQLite file."""
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            path: SQLite file for the persistent tier (memory-only if None)
+            max_entries: Number of responses kept in the in-process LRU
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the prompt parts into a cache key."""
+        return hashlib.md5("\x1f".join(parts).encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+    
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value) VALUES (?, ?)", (key, value)
+                )
+                self._db.commit()
+    
+    def _remember(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
 
 
 class LLMQueryGenerator:
     """Handles LLM interactions for SQL query generation."""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache_path: Optional[str] = None):
         """
         Initialize Google Generative AI client.
         
         Args:
             api_key: Google Generative AI API key
+            cache_path: SQLite file for cached LLM responses (in-memory only if None)
         """
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.response_cache = LLMResponseCache(cache_path)
         self.schema_info = None
+        self._sql_prompt_prefix = ""
+        self._schema_digest = ""
+        self.cached_sql_model = None
+        self._sql_cache_expires_at = None
+        # One refresh at a time: each CachedContent.create is a separately billed cache
+        self._sql_cache_lock = threading.Lock()
     
     def set_schema_info(self, schema_info: str):
-        """Set database schema information."""
+        """Set database schema information and cache the static SQL prompt prefix."""
         self.schema_info = schema_info
+        # Assembled once; each request only appends the question
+        self._sql_prompt_prefix = (
+            f"{_SQL_INSTRUCTIONS}\n\nDatabase Schema:\n{schema_info}\n\n{_SQL_RULES}\n\n"
+        )
+        self._schema_digest = LLMResponseCache.make_key(schema_info)
+        with self._sql_cache_lock:
+            self._create_sql_prompt_cache()
+
+    def _create_sql_prompt_cache(self):
+        """
+        Register the schema and rules as Gemini cached content so each request
+        only sends the question. Falls back to full inline prompts if the cache
+        cannot be created (e.g. the prefix is below the model's minimum cacheable size).
+        """
+        try:
+            cache = caching.CachedContent.create(
+                model=f"models/{GEMINI_MODEL}",
+                system_instruction=f"{_SQL_INSTRUCTIONS}\n\n{_SQL_RULES}",
+                contents=[f"Database Schema:\n{self.schema_info}"],
+                ttl=SQL_PROMPT_CACHE_TTL,
+            )
+        except Exception as e:
+            print(f"Gemini prompt caching unavailable, using inline prompts: {e}")
+            self.cached_sql_model = None
+            return
+        # refresh a minute early so requests never hit an expired cache
+        self._sql_cache_expires_at = datetime.utcnow() + SQL_PROMPT_CACHE_TTL - timedelta(minutes=1)
+        self.cached_sql_model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+
+    def _sql_model(self):
+        """Return the cached-prefix model if available (recreating it after expiry), else None."""
+        if self.cached_sql_model and datetime.utcnow() >= self._sql_cache_expires_at:
+            with self._sql_cache_lock:
+                # another thread may have refreshed it while we waited
+                if self.cached_sql_model and datetime.utcnow() >= self._sql_cache_expires_at:
+                    self._create_sql_prompt_cache()
+        return self.cached_sql_model
     
     def generate_sql_query(
         self,
         natural_language_query: str,
         conversation_context: Optional[str] = None,
+        bypass_cache: bool = False,
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Generate SQL query from natural language using LLM.
         
         Args:
             natural_language_query: User's natural language query
+            conversation_context: Relevant snippets from prior conversation
+            bypass_cache: If True, always call the LLM (the fresh result is still cached)
             
         Returns:
             Tuple of (sql_query, error_message)
@@ -234,49 +512,38 @@ Conversation Context:
 {conversation_context}
 """
 
-        prompt = f"""You are a SQL query generator for a MySQL database. 
-Given the following database schema and a natural language question, generate ONLY a valid MySQL SQL query.
-
-Database Schema:
-{self.schema_info}
-
-Rules:
-1. Generate ONLY the SQL query, no explanations or markdown formatting
-2. Use proper JOINs when needed
-3. Use appropriate WHERE clauses for filtering
-4. Use aggregate functions (COUNT, SUM, AVG, etc.) when appropriate
-5. Handle NULL values properly
-6. Use proper table and column names from the schema
-7. Return only SELECT queries (read-only operations)
-8. Do not include any text before or after the SQL query
-9. If the query requires grouping, use GROUP BY appropriately
-10. Use LIMIT if the user asks for top N or limited results
-
-If relevant, incorporate the insights provided in the conversation context.
-
-Natural Language Query: {natural_language_query}
+        question = f"""Natural Language Query: {natural_language_query}
 
 {context_block}
 
 SQL Query:"""
 
+        cache_key = LLMResponseCache.make_key("sql", GEMINI_MODEL, self._schema_digest, question)
+        if not bypass_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached, None
+
         try:
-            response = self.model.generate_content(prompt)
+            cached_model = self._sql_model()
+            if cached_model:
+                response = cached_model.generate_content(question)
+            else:
+                response = self.model.generate_content(self._sql_prompt_prefix + question)
             sql_query = response.text.strip()
             
             # Clean up the SQL query - remove markdown code blocks if present
-            sql_query = re.sub(r'```sql\n?', '', sql_query, flags=re.IGNORECASE)
-            sql_query = re.sub(r'```\n?', '', sql_query)
-            sql_query = sql_query.strip()
+            sql_query = _CODE_FENCE.sub('', sql_query).strip()
             
             # Check if query is empty
             if not sql_query:
                 return None, "Generated SQL query is empty. Please rephrase your question."
             
             # Ensure it's a SELECT query for safety
-            if not sql_query.upper().strip().startswith('SELECT'):
+            if sql_query[:6].upper() != 'SELECT':
                 return None, "Generated query is not a SELECT query. Only read operations are allowed."
             
+            self.response_cache.set(cache_key, sql_query)
             return sql_query, None
             
         except Exception as e:
@@ -288,6 +555,7 @@ SQL Query:"""
         data: List[Dict],
         natural_language_query: str,
         conversation_context: Optional[str] = None,
+        bypass_cache: bool = False,
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Analyze query results using LLM and provide insights.
@@ -297,6 +565,7 @@ SQL Query:"""
             data: Query results as list of dictionaries
             natural_language_query: Original natural language query
             conversation_context: Relevant snippets from prior conversation
+            bypass_cache: If True, always call the LLM (the fresh result is still cached)
             
         Returns:
             Tuple of (analysis, error_message)
@@ -307,8 +576,17 @@ SQL Query:"""
         data_for_analysis = data[:max_rows_for_analysis] if len(data) > max_rows_for_analysis else data
         total_rows = len(data)
         
-        # Convert data to JSON string for LLM
-        data_str = json.dumps(data_for_analysis, indent=2)
+        # Convert data to JSON string for LLM; long text cells are truncated
+        data_for_analysis = [
+            {
+                key: value[:MAX_ANALYSIS_CELL_CHARS] + "..."
+                if isinstance(value, str) and len(value) > MAX_ANALYSIS_CELL_CHARS
+                else value
+                for key, value in row.items()
+            }
+            for row in data_for_analysis
+        ]
+        data_str = _json_dumps(data_for_analysis)  # compact: no indent tokens in the prompt
         
         data_info = f"Total rows: {total_rows}" if total_rows > max_rows_for_analysis else f"Total rows: {total_rows}"
         if total_rows > max_rows_for_analysis:
@@ -344,15 +622,38 @@ Please provide the below only if its applicable based on the query results, for
 
 Format your response in a clear, structured manner. Be concise but informative."""
 
+        # the prompt embeds the SQL, question, context and (truncated) data
+        cache_key = LLMResponseCache.make_key("analysis", GEMINI_MODEL, prompt)
+        if not bypass_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached, None
+
         try:
             response = self.model.generate_content(prompt)
             analysis = response.text.strip()
+            self.response_cache.set(cache_key, analysis)
             return analysis, None
             
         except Exception as e:
             return None, f"Error analyzing data: {str(e)}"
 
 
+class QueryResult(NamedTuple):
+    """Fixed-shape outcome of QueryProcessor.process_query (unpack positionally)."""
+    session_id: str
+    sql_query: Optional[str]
+    data: Optional[List[Dict[str, Any]]]
+    analysis: Optional[str]
+    memory_context: List[Dict[str, Any]]
+    memory_warning: Optional[str]
+    error: Optional[str]
+
+
+class QueryTimeoutError(Exception):
+    """Raised by process_query when its deadline passes between pipeline steps."""
+
+
 class QueryProcessor:
     """Main class that orchestrates the query processing pipeline."""
     
@@ -365,8 +666,10 @@ class QueryProcessor:
             api_key: Google Generative AI API key
         """
         self.db = DatabaseConnection(**db_config)
-        self.llm = LLMQueryGenerator(api_key)
         memory_dir = os.getenv("MEMORY_STORE_DIR", "memory_store")
+        self.llm = LLMQueryGenerator(
+            api_key, cache_path=os.path.join(memory_dir, "sql_cache.sqlite")
+        )
         embedding_model = os.getenv(
             "MEMORY_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
         )
@@ -379,6 +682,8 @@ class QueryProcessor:
         self.memory_similarity_threshold = float(
             os.getenv("MEMORY_SIMILARITY_THRESHOLD", "0.5")
         )
+        # Background work that does not need to finish before the response (memory writes)
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-processor")
         
         # Set schema info for LLM
         schema_info = self.db.get_schema_info()
@@ -388,7 +693,10 @@ class QueryProcessor:
         self.db.connect()
     
     def _build_conversation_context(
-        self, session_id: str, natural_language_query: str
+        self,
+        session_id: str,
+        natural_language_query: str,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> Tuple[str, List[Dict[str, Any]]]:
         """Retrieve relevant conversation history for the given session."""
         if not natural_language_query:
@@ -400,6 +708,7 @@ class QueryProcessor:
                 top_k_session=self.memory_session_top_k,
                 top_k_global=self.memory_global_top_k,
                 similarity_threshold=self.memory_similarity_threshold,
+                query_embedding=query_embedding,
             )
         except Exception as exc:
             warning = f"Conversation memory unavailable due to error: {exc}"
@@ -426,7 +735,7 @@ class QueryProcessor:
             return ""
         preview_rows = data[:5]
         try:
-            return json.dumps(preview_rows, indent=2)
+            return _json_dumps(preview_rows)
         except (TypeError, ValueError):
             return str(preview_rows)
 
@@ -435,7 +744,10 @@ class QueryProcessor:
         natural_language_query: str,
         session_id: Optional[str] = None,
         reset_session: bool = False,
-    ) -> Dict[str, Any]:
+        bypass_cache: bool = False,
+        deadline: Optional[float] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> QueryResult:
         """
         Process a natural language query end-to-end.
         
@@ -443,16 +755,25 @@ class QueryProcessor:
             natural_language_query: User's natural language query
             session_id: Identifier for the conversational session
             reset_session: If True, clears stored memory for the session before processing
+            bypass_cache: If True, regenerate SQL and analysis instead of reusing cached LLM responses
+            deadline: time.monotonic() value after which the query is abandoned. It is checked
+                between steps only: an LLM or database call already in flight runs to completion.
+                An abandoned query is not written to conversation memory.
+            query_embedding: Precomputed normalized embedding of the query (e.g. from a cache
+                lookup), reused for the memory search instead of encoding the query again
             
         Returns:
-            Dictionary containing:
+            QueryResult of:
+                - session_id: Session identifier used for this request
                 - sql_query: Generated SQL query
                 - data: Query results
                 - analysis: LLM analysis of results
-                - error: Error message if any
-                - session_id: Session identifier used for this request
                 - memory_context: Entries retrieved from the memory store
                 - memory_warning: Any warning encountered while retrieving memory
+                - error: Error message if any
+
+        Raises:
+            QueryTimeoutError: If the deadline passed before the pipeline finished
         """
         active_session_id = session_id or f"session_{uuid.uuid4().hex[:12]}"
 
@@ -465,7 +786,7 @@ class QueryProcessor:
         sanitized_context: List[Dict[str, Any]] = []
         if not reset_session:
             memory_context_text, memory_entries = self._build_conversation_context(
-                active_session_id, natural_language_query
+                active_session_id, natural_language_query, query_embedding
             )
             if memory_context_text.startswith("Conversation memory unavailable"):
                 context_warning = memory_context_text
@@ -486,67 +807,93 @@ class QueryProcessor:
                         }
                     )
 
-        result = {
-            "sql_query": None,
-            "data": None,
-            "analysis": None,
-            "error": None,
-            "session_id": active_session_id,
-            "memory_context": sanitized_context,
-            "memory_warning": context_warning,
-        }
-        
         # Step 1: Generate SQL query from natural language
         sql_query, error = self.llm.generate_sql_query(
-            natural_language_query, conversation_context=memory_context_text
+            natural_language_query,
+            conversation_context=memory_context_text,
+            bypass_cache=bypass_cache,
         )
         if error:
-            result["error"] = error
-            return result
-        
-        result["sql_query"] = sql_query
+            return QueryResult(
+                active_session_id, None, None, None, sanitized_context, context_warning, error
+            )
         
+        self._check_deadline(deadline)
+
         # Step 2: Execute SQL query
         data, error = self.db.execute_query(sql_query)
         if error:
-            result["error"] = f"SQL execution error: {error}"
-            return result
-        
-        result["data"] = data
+            return QueryResult(
+                active_session_id, sql_query, None, None, sanitized_context, context_warning,
+                f"SQL execution error: {error}",
+            )
         
+        self._check_deadline(deadline)
+
         # Step 3: Analyze data using LLM
         analysis, error = self.llm.analyze_data(
             sql_query,
             data,
             natural_language_query,
             conversation_context=memory_context_text,
+            bypass_cache=bypass_cache,
         )
         if error:
-            result["error"] = f"Analysis error: {error}"
-            return result
-        
-        result["analysis"] = analysis
-
-        # Step 4: Persist conversation memory
-        data_preview = self._prepare_data_preview(data)
-        extra_metadata = {
-            "analysis_length": len(analysis) if analysis else 0,
-            "sql_length": len(sql_query) if sql_query else 0,
-            "processed_at": datetime.utcnow().isoformat(),
-        }
-        self.memory.add_entry(
-            session_id=active_session_id,
-            user_query=natural_language_query,
-            sql_query=sql_query,
-            analysis=analysis or "",
-            data_preview=data_preview,
-            extra_metadata=extra_metadata,
+            return QueryResult(
+                active_session_id, sql_query, data, None, sanitized_context, context_warning,
+                f"Analysis error: {error}",
+            )
+
+        # Step 4: Persist conversation memory (embed + FAISS/JSON writes) off the response path
+        self._executor.submit(
+            self._persist_memory,
+            active_session_id,
+            natural_language_query,
+            sql_query,
+            analysis,
+            data,
+            time.time_ns(),
         )
         
-        return result
+        return QueryResult(
+            active_session_id, sql_query, data, analysis, sanitized_context, context_warning, None
+        )
+
+    @staticmethod
+    def _check_deadline(deadline: Optional[float]):
+        if deadline is not None and time.monotonic() > deadline:
+            raise QueryTimeoutError("Query processing timed out")
+
+    def _persist_memory(
+        self,
+        session_id: str,
+        natural_language_query: str,
+        sql_query: str,
+        analysis: Optional[str],
+        data: List[Dict[str, Any]],
+        processed_at_ns: int,
+    ):
+        """Store a completed turn in conversation memory (runs on the background executor)."""
+        try:
+            extra_metadata = {
+                "analysis_length": len(analysis) if analysis else 0,
+                "sql_length": len(sql_query) if sql_query else 0,
+                "processed_at_ns": processed_at_ns,
+            }
+            self.memory.add_entry(
+                session_id=session_id,
+                user_query=natural_language_query,
+                sql_query=sql_query,
+                analysis=analysis or "",
+                data_preview=self._prepare_data_preview(data),
+                extra_metadata=extra_metadata,
+            )
+        except Exception as e:
+            print(f"Error saving conversation memory: {e}")
     
     def close(self):
-        """Close database connection."""
+        """Flush pending memory writes and close database connection."""
+        self._executor.shutdown(wait=True)
         self.db.disconnect()
 
 
@@ -562,6 +909,7 @@ def create_query_processor() -> QueryProcessor:
         - DB_NAME: Database name (default: olist_db)
         - DB_USER: MySQL username (default: root)
         - DB_PASSWORD: MySQL password (default: empty)
+        - DB_POOL_SIZE: Pooled MySQL connections shared by concurrent requests (default: 8; extra queries wait for a free one)
         - MEMORY_STORE_DIR: Directory for FAISS index persistence (default: memory_store)
         - MEMORY_SESSION_TOP_K: Number of session-specific memories to retrieve (default: 4)
         - MEMORY_GLOBAL_TOP_K: Number of cross-session memories to retrieve (default: 2)
@@ -580,7 +928,8 @@ def create_query_processor() -> QueryProcessor:
         "port": int(os.getenv("DB_PORT", "3306")),
         "database": os.getenv("DB_NAME", "olist_db"),
         "user": os.getenv("DB_USER", "root"),
-        "password": os.getenv("DB_PASSWORD", "")
+        "password": os.getenv("DB_PASSWORD", ""),
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "8")),
     }
     
     return QueryProcessor(db_config, api_key)
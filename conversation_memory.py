@@ -5,16 +5,104 @@ This module stores and retrieves conversational context across sessions.
 
 import os
 import json
+import queue
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import List, Dict, Optional, Any
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Tuple
 
 import numpy as np
 import faiss  # type: ignore
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
 from sentence_transformers import SentenceTransformer
 
 
 DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 32
+# Entries are embedded from the user's question only; longer inputs are truncated
+EMBEDDING_MAX_TOKENS = 128
+# Below this many entries an exhaustive scan beats HNSW's overhead
+HNSW_MIN_ENTRIES = 2000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 64
+HNSW_EF_SEARCH = 32
+# Vectors added since the last merge are scored exactly from the float32 buffer; once this
+# many are pending the FAISS index is rebuilt and rewritten (the loaded index is read-only)
+INDEX_MERGE_EVERY = 256
+# Vectors are stored as float16 inside FAISS (half the bytes per scan); needs no training
+INDEX_QUANTIZER = faiss.ScalarQuantizer.QT_fp16
+# Single JSON document written by earlier versions; converted to JSON Lines on load
+LEGACY_METADATA_FILENAME = "metadata.json"
+
+
+def _fmt_ts(timestamp_ns: int) -> str:
+    """Render a stored UTC time.time_ns() value as ISO 8601 (done only at the API edge)."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
+
+def _parse_ts(timestamp: str) -> int:
+    """Convert a legacy naive-UTC ISO timestamp to epoch nanoseconds."""
+    parsed = datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1e9)
+
+
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+@lru_cache(maxsize=4)
+def _get_model(name: str) -> SentenceTransformer:
+    """Load each sentence-transformer once per process."""
+    model = SentenceTransformer(name)
+    model.max_seq_length = min(model.max_seq_length, EMBEDDING_MAX_TOKENS)
+    return model
+
+
+class _EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text encodes into one batched model call.
+    Texts queued while a batch is encoding go out together in the next one,
+    so a lone request is encoded immediately and never waits for a window.
+    """
+
+    def __init__(self, encode_batch, max_batch: int = EMBEDDING_BATCH_SIZE):
+        self._encode_batch = encode_batch
+        self._max_batch = max_batch
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, text: str) -> np.ndarray:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
 
 
 class ConversationMemory:
@@ -24,75 +112,173 @@ class ConversationMemory:
         self,
         storage_dir: str = "memory_store",
         index_filename: str = "memory.index",
-        metadata_filename: str = "metadata.json",
+        metadata_filename: str = "metadata.jsonl",
         embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+        embeddings_filename: str = "query_embeddings.f32",
     ):
         self.storage_dir = storage_dir
         self.index_path = os.path.join(storage_dir, index_filename)
         self.metadata_path = os.path.join(storage_dir, metadata_filename)
+        self.embeddings_path = os.path.join(storage_dir, embeddings_filename)
         self.embedding_model_name = embedding_model
 
         os.makedirs(self.storage_dir, exist_ok=True)
+        # Guards index/metadata/embeddings; entries may be added from a background thread
+        self._lock = threading.RLock()
 
-        self.model = SentenceTransformer(self.embedding_model_name)
+        self.model = _get_model(self.embedding_model_name)
         self.dimension = self.model.get_sentence_embedding_dimension()
+        self._query_encoder = _EmbeddingBatcher(self._create_embeddings)
 
         self.index = self._load_index()
         self.metadata: List[Dict[str, Any]] = self._load_metadata()
-
-        # Ensure index and metadata sizes match; rebuild if necessary
-        if self.index.ntotal != len(self.metadata):
+        for entry in self.metadata:
+            if "timestamp_ns" not in entry:  # written before int timestamps
+                entry["timestamp_ns"] = _parse_ts(entry.pop("timestamp"))
+            if "context_snippet" not in entry:
+                entry["context_snippet"] = self._prepare_context_snippet(entry)
+            entry.pop("embedding_text", None)  # rebuilt on demand from the entry's fields
+        # (N, dim) float32 vectors in metadata order; rows past _n are spare capacity
+        self._embeddings, migrated = self._load_embeddings()
+        self._n = len(self._embeddings)
+        # Index positions of each session's vectors (positions follow metadata order)
+        self._session_to_ids: Dict[str, List[int]] = self._map_sessions()
+        # Vectors [0, _indexed) are in self.index; later ones are pending the next merge
+        self._indexed = self.index.ntotal
+        # Background merges build off-lock; a reset bumps the generation so stale builds are dropped
+        self._merging = False
+        self._generation = 0
+        # Change counters for HTTP validators; the epoch keeps tags unique across restarts
+        self._epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._session_versions: Dict[str, int] = {}
+
+        # Rebuild if the index is stale or too far behind the stored vectors
+        if (
+            migrated
+            or self._indexed > self._n
+            or self._n - self._indexed >= INDEX_MERGE_EVERY
+        ):
             self._rebuild_index_from_metadata()
+        if migrated:
+            self._save_embeddings()
+            self._save_metadata()
 
     def _load_index(self) -> faiss.Index:
         if os.path.exists(self.index_path):
-            return faiss.read_index(self.index_path)
-        return faiss.IndexFlatIP(self.dimension)
+            # Never mutated in place (merges build a fresh index), so map it read-only
+            return faiss.read_index(
+                self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        return self._new_index(0)
+
+    def _new_index(self, size: int) -> faiss.Index:
+        """Empty index suited to size vectors (inner product == cosine on normalized vectors)."""
+        if size < HNSW_MIN_ENTRIES:
+            return faiss.IndexScalarQuantizer(
+                self.dimension, INDEX_QUANTIZER, faiss.METRIC_INNER_PRODUCT
+            )
+        index = faiss.IndexHNSWSQ(
+            self.dimension, INDEX_QUANTIZER, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
 
     def _load_metadata(self) -> List[Dict[str, Any]]:
         if os.path.exists(self.metadata_path):
             with open(self.metadata_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+                return [_loads(line) for line in f if line.strip()]
+        legacy_path = os.path.join(self.storage_dir, LEGACY_METADATA_FILENAME)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                self.metadata = json.load(f)
+            self._save_metadata()
+            return self.metadata
         return []
 
+    def _load_embeddings(self) -> Tuple[np.ndarray, bool]:
+        """Load stored query embeddings; returns (embeddings, migrated) where migrated means re-encoded."""
+        if os.path.exists(self.embeddings_path):
+            # Raw float32 rows, appended as entries are added
+            stored = np.fromfile(self.embeddings_path, dtype="float32")
+            if stored.size == len(self.metadata) * self.dimension:
+                return stored.reshape(-1, self.dimension), False
+
+        if not self.metadata:
+            return np.empty((0, self.dimension), dtype="float32"), False
+        # Older stores embedded the whole turn (query, SQL, analysis, preview), so re-encode
+        embeddings = self._create_embeddings([entry["user_query"] for entry in self.metadata])
+        for entry in self.metadata:
+            entry.pop("embedding", None)
+        return embeddings, True
+
+    def _map_sessions(self) -> Dict[str, List[int]]:
+        session_to_ids: Dict[str, List[int]] = {}
+        for position, entry in enumerate(self.metadata):
+            session_to_ids.setdefault(entry.get("session_id"), []).append(position)
+        return session_to_ids
+
+    def _append_embeddings(self, embeddings: np.ndarray):
+        """Append rows to the embedding buffer, doubling its capacity when full."""
+        needed = self._n + len(embeddings)
+        if needed > len(self._embeddings):
+            grown = np.empty(
+                (max(needed, 2 * len(self._embeddings)), self.dimension), dtype="float32"
+            )
+            grown[: self._n] = self._embeddings[: self._n]
+            self._embeddings = grown
+        self._embeddings[self._n : needed] = embeddings
+        self._n = needed
+
     def _rebuild_index_from_metadata(self):
-        """Rebuild FAISS index from stored metadata embeddings."""
-        self.index = faiss.IndexFlatIP(self.dimension)
+        """Rebuild FAISS index from the stored embedding matrix (merges pending vectors)."""
+        self.index = self._new_index(self._n)
+        self._indexed = self._n
         if not self.metadata:
             self._save_index()
             return
 
-        embeddings = np.array(
-            [entry["embedding"] for entry in self.metadata], dtype="float32"
-        )
-        faiss.normalize_L2(embeddings)
+        # Vectors are L2-normalized at encode time (normalize_embeddings=True)
+        embeddings = self._embeddings[: self._n]
+        if __debug__:
+            sample = embeddings[:: max(1, self._n // 64)]
+            np.testing.assert_allclose(np.linalg.norm(sample, axis=1), 1.0, atol=1e-5)
         self.index.add(embeddings)
         self._save_index()
 
     def _save_index(self):
-        faiss.write_index(self.index, self.index_path)
+        # new file + rename, like _merge_pending (whose off-lock ".tmp" this must not share)
+        tmp_path = self.index_path + ".save.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+    def _save_embeddings(self):
+        """Rewrite the whole embedding file (only needed when entries are removed)."""
+        self._embeddings[: self._n].tofile(self.embeddings_path)
 
     def _save_metadata(self):
+        """Rewrite the whole JSON Lines log (only needed when entries are removed)."""
         with open(self.metadata_path, "w", encoding="utf-8") as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+            f.writelines(_dumps(entry) + "\n" for entry in self.metadata)
+
+    def _append_metadata(self, entries: List[Dict[str, Any]]):
+        with open(self.metadata_path, "a", encoding="utf-8") as f:
+            f.writelines(_dumps(entry) + "\n" for entry in entries)
 
     def _create_embedding(self, text: str) -> np.ndarray:
-        embedding = self.model.encode(
-            text, convert_to_numpy=True, normalize_embeddings=True
+        # concurrent searches share one forward pass
+        return self._query_encoder.encode(text)
+
+    def _create_embeddings(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
         )
-        return embedding.astype("float32")
-
-    def _format_embedding_text(
-        self, user_query: str, sql_query: str, analysis: str, data_preview: str
-    ) -> str:
-        parts = [
-            f"User Query: {user_query}",
-            f"SQL Query: {sql_query}",
-            f"Analysis: {analysis}",
-        ]
-        if data_preview:
-            parts.append(f"Data Preview: {data_preview}")
-        return "\n".join(parts)
+        return embeddings.astype("float32")
 
     def add_entry(
         self,
@@ -104,43 +290,87 @@ class ConversationMemory:
         extra_metadata: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """Add a new conversational memory entry."""
-        entry_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-
-        embedding_text = self._format_embedding_text(
-            user_query=user_query,
-            sql_query=sql_query,
-            analysis=analysis,
-            data_preview=data_preview,
-        )
-        embedding = self._create_embedding(embedding_text)
-
-        metadata_entry: Dict[str, Any] = {
-            "id": entry_id,
-            "session_id": session_id,
-            "timestamp": timestamp,
-            "user_query": user_query,
-            "sql_query": sql_query,
-            "analysis": analysis,
-            "data_preview": data_preview,
-            "embedding_text": embedding_text,
-            "embedding": embedding.tolist(),
-        }
-
-        if extra_metadata:
-            metadata_entry.update(extra_metadata)
-
-        self.metadata.append(metadata_entry)
-        self.index.add(np.expand_dims(embedding, axis=0))
+        return self.add_entries(
+            [
+                {
+                    "session_id": session_id,
+                    "user_query": user_query,
+                    "sql_query": sql_query,
+                    "analysis": analysis,
+                    "data_preview": data_preview,
+                    "extra_metadata": extra_metadata,
+                }
+            ]
+        )[0]
 
-        self._save_index()
-        self._save_metadata()
+    def add_entries(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add several entries (add_entry keyword dicts) with one batched encode and save."""
+        if not entries:
+            return []
 
-        return metadata_entry
+        timestamp_ns = time.time_ns()
+        embeddings = self._create_embeddings([item["user_query"] for item in entries])
+
+        added: List[Dict[str, Any]] = []
+        for item in entries:
+            metadata_entry: Dict[str, Any] = {
+                "id": str(uuid.uuid4()),
+                "session_id": item["session_id"],
+                "timestamp_ns": timestamp_ns,
+                "user_query": item["user_query"],
+                "sql_query": item["sql_query"],
+                "analysis": item["analysis"],
+                "data_preview": item["data_preview"],
+            }
+
+            if item.get("extra_metadata"):
+                metadata_entry.update(item["extra_metadata"])
+            # Entries never change once written, so the snippet is built once here
+            metadata_entry["context_snippet"] = self._prepare_context_snippet(metadata_entry)
+            added.append(metadata_entry)
+
+        with self._lock:
+            for position, entry in enumerate(added, start=len(self.metadata)):
+                self._session_to_ids.setdefault(entry["session_id"], []).append(position)
+            self.metadata.extend(added)
+            self._append_embeddings(embeddings)
+            with open(self.embeddings_path, "ab") as f:
+                f.write(embeddings.tobytes())
+            self._append_metadata(added)
+            self._bump_versions({entry["session_id"] for entry in added})
+
+        self._merge_pending()
+        return added
+
+    def _merge_pending(self):
+        """Fold pending vectors into a new index built outside the lock, then swap it in."""
+        with self._lock:
+            if self._merging or self._n - self._indexed < INDEX_MERGE_EVERY:
+                return
+            self._merging = True
+            generation, n = self._generation, self._n
+            # rows below _n are never rewritten in place (appends go past it, resets reallocate)
+            embeddings = self._embeddings[:n]
+
+        try:
+            index = self._new_index(n)  # also picks HNSW once the store is large
+            index.add(embeddings)
+            # new file + rename: the live index may be memory-mapped from index_path
+            tmp_path = self.index_path + ".tmp"
+            faiss.write_index(index, tmp_path)
+            with self._lock:
+                if generation == self._generation:
+                    os.replace(tmp_path, self.index_path)
+                    self.index, self._indexed = index, n
+                else:
+                    os.remove(tmp_path)  # a reset rebuilt the index meanwhile
+        finally:
+            with self._lock:
+                self._merging = False
 
     def _prepare_context_snippet(self, entry: Dict[str, Any]) -> str:
         snippet = [
-            f"- Timestamp: {entry.get('timestamp')}",
+            f"- Timestamp: {_fmt_ts(entry['timestamp_ns'])}",
             f"- User Query: {entry.get('user_query')}",
             f"- SQL Query: {entry.get('sql_query')}",
             f"- Analysis Summary: {entry.get('analysis')}",
@@ -156,92 +386,158 @@ class ConversationMemory:
         top_k_session: int = 5,
         top_k_global: int = 5,
         similarity_threshold: float = 0.0,
+        query_embedding: Optional[np.ndarray] = None,
     ) -> List[Dict[str, Any]]:
-        """Search for relevant conversation memories."""
-        if not self.metadata or self.index.ntotal == 0:
+        """Search for relevant conversation memories (reusing ``query_embedding`` if given)."""
+        if not self.metadata:
             return []
 
-        embedding = self._create_embedding(query)
-        top_k = min(len(self.metadata), max(top_k_session, top_k_global) * 2)
-        scores, indices = self.index.search(
-            np.expand_dims(embedding, axis=0), top_k
-        )
-
-        flat_indices = indices[0]
-        flat_scores = scores[0]
-
-        session_results: List[Dict[str, Any]] = []
-        global_results: List[Dict[str, Any]] = []
-
-        for idx, score in zip(flat_indices, flat_scores):
-            if idx < 0 or idx >= len(self.metadata):
-                continue
-            if float(score) < similarity_threshold:
-                continue
-            entry = {
-                key: value
-                for key, value in self.metadata[idx].items()
-                if key != "embedding"
-            }
-            entry["similarity"] = float(score)
-
-            if session_id and entry.get("session_id") == session_id:
-                if len(session_results) < top_k_session:
-                    entry["context_snippet"] = self._prepare_context_snippet(entry)
-                    session_results.append(entry)
+        if query_embedding is None:
+            query_embedding = self._create_embedding(query)
+        query_vector = np.expand_dims(np.asarray(query_embedding, dtype="float32"), axis=0)
+        with self._lock:
+            if self._n == 0:
+                return []
+            session_ids = self._session_to_ids.get(session_id) if session_id else None
+
+            # Two filtered searches: this session's vectors, then everything else
+            session_results: List[Dict[str, Any]] = []
+            session_positions = None
+            if session_ids:
+                session_positions = np.array(session_ids, dtype="int64")
+                session_results = self._search_selected(
+                    query_vector, top_k_session, session_positions, False, similarity_threshold
+                )
+            global_results = self._search_selected(
+                query_vector, top_k_global, session_positions, True, similarity_threshold
+            )
+        return session_results + global_results
+
+    def _search_selected(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        positions: Optional[np.ndarray],
+        exclude: bool,
+        similarity_threshold: float,
+    ) -> List[Dict[str, Any]]:
+        """Top-k hits among positions, or among all other vectors if exclude (all if None)."""
+        if k <= 0:
+            return []
+        hit_ids: List[np.ndarray] = []
+        hit_scores: List[np.ndarray] = []
+
+        # Merged vectors: FAISS search restricted with an ID selector
+        k_indexed = min(k, self._indexed)
+        if k_indexed > 0:
+            selector = batch = None
+            if positions is not None:
+                selector = batch = faiss.IDSelectorBatch(positions)
+                if exclude:
+                    selector = faiss.IDSelectorNot(batch)  # batch must outlive the search
+            if isinstance(self.index, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.index.hnsw.efSearch)
             else:
-                if len(global_results) < top_k_global:
-                    entry["context_snippet"] = self._prepare_context_snippet(entry)
-                    global_results.append(entry)
-
-            if len(session_results) >= top_k_session and len(global_results) >= top_k_global:
-                break
-
-        combined_results = session_results + [
-            entry for entry in global_results if entry not in session_results
-        ]
-        return combined_results[: top_k_session + top_k_global]
+                params = faiss.SearchParameters(sel=selector)
+            scores, indices = self.index.search(query_vector, k_indexed, params=params)
+            found = indices[0] >= 0  # -1 pads missing hits
+            hit_ids.append(indices[0][found])
+            hit_scores.append(scores[0][found])
+
+        # Pending vectors: exact inner products straight from the buffer
+        if self._n > self._indexed:
+            pending = np.arange(self._indexed, self._n)
+            if positions is not None:
+                pending = pending[np.isin(pending, positions, invert=exclude)]
+            hit_ids.append(pending)
+            hit_scores.append(self._embeddings[pending] @ query_vector[0])
+
+        if not hit_ids:
+            return []
+        ids = np.concatenate(hit_ids)
+        scores = np.concatenate(hit_scores)
+        top = np.argsort(-scores, kind="stable")[:k]
+        top = top[scores[top] >= similarity_threshold]
+
+        results: List[Dict[str, Any]] = []
+        for idx, score in zip(ids[top].tolist(), scores[top].tolist()):
+            entry = dict(self.metadata[idx])
+            entry["timestamp"] = _fmt_ts(entry["timestamp_ns"])
+            entry["similarity"] = score
+            results.append(entry)
+        return results
 
     def reset_session(self, session_id: str):
         """Remove all entries for a given session and rebuild the index."""
         if not session_id:
             return
 
-        original_length = len(self.metadata)
-        self.metadata = [
-            entry for entry in self.metadata if entry.get("session_id") != session_id
-        ]
-
-        if len(self.metadata) != original_length:
+        with self._lock:
+            keep = [entry.get("session_id") != session_id for entry in self.metadata]
+            if all(keep):
+                return
+
+            self.metadata = [entry for entry, kept in zip(self.metadata, keep) if kept]
+            self._embeddings = self._embeddings[: self._n][np.array(keep, dtype=bool)]
+            self._n = len(self._embeddings)
+            self._session_to_ids = self._map_sessions()
+            self._bump_versions([session_id])
+            self._generation += 1
             self._rebuild_index_from_metadata()
+            self._save_embeddings()
             self._save_metadata()
 
-    def list_sessions(self) -> List[Dict[str, Any]]:
-        """Return summary information about stored sessions."""
-        sessions: Dict[str, Dict[str, Any]] = {}
-        for entry in self.metadata:
-            sid = entry.get("session_id")
-            if sid not in sessions:
-                sessions[sid] = {
-                    "session_id": sid,
-                    "count": 0,
-                    "latest_timestamp": entry.get("timestamp"),
-                }
-            sessions[sid]["count"] += 1
-            if entry.get("timestamp") > sessions[sid]["latest_timestamp"]:
-                sessions[sid]["latest_timestamp"] = entry.get("timestamp")
+    def list_sessions(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return summary information about stored sessions, most recently active first."""
+        with self._lock:
+            # positions are in append order, so a session's last id is its latest entry
+            agg = sorted(
+                (
+                    (sid, len(ids), self.metadata[ids[-1]]["timestamp_ns"])
+                    for sid, ids in self._session_to_ids.items()
+                ),
+                key=lambda item: item[2],
+                reverse=True,
+            )
+        end = None if limit is None else offset + limit
+        return [
+            {"session_id": sid, "count": count, "latest_timestamp": _fmt_ts(latest_ns)}
+            for sid, count, latest_ns in agg[offset:end]
+        ]
 
-        return sorted(
-            sessions.values(), key=lambda s: s.get("latest_timestamp", ""), reverse=True
-        )
+    def _bump_versions(self, session_ids):
+        self._version += 1
+        for session_id in session_ids:
+            self._session_versions[session_id] = self._version
+
+    def version(self, session_id: Optional[str] = None) -> str:
+        """Opaque tag that changes whenever the store (or the given session) changes."""
+        with self._lock:
+            if session_id is None:
+                return f"{self._epoch}-{self._version}"
+            return f"{self._epoch}-{self._session_versions.get(session_id, 0)}"
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Normalized embedding for a query, shared with concurrent searches."""
+        return self._create_embedding(text)
+
+    def recent_queries(self, session_id: str, limit: int) -> List[str]:
+        """Return the user queries of the last ``limit`` turns of a session, oldest first."""
+        if not session_id or limit <= 0:
+            return []
+        with self._lock:
+            positions = self._session_to_ids.get(session_id, [])[-limit:]
+            return [self.metadata[pos]["user_query"] for pos in positions]
 
-    def get_session_history(self, session_id: str) -> List[Dict[str, Any]]:
-        """Retrieve all entries for a given session ordered by timestamp."""
+    def get_session_history(
+        self, session_id: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Retrieve a page of entries for a given session, oldest first."""
         if not session_id:
             return []
-        entries = [
-            entry for entry in self.metadata if entry.get("session_id") == session_id
-        ]
-        return sorted(entries, key=lambda e: e.get("timestamp", ""))
-
-
+        end = None if limit is None else offset + limit
+        with self._lock:
+            # only the requested page is copied out of the store
+            positions = self._session_to_ids.get(session_id, [])[offset:end]
+            entries = [self.metadata[pos] for pos in positions]
+        return [dict(entry, timestamp=_fmt_ts(entry["timestamp_ns"])) for entry in entries]
@@ -3,38 +3,289 @@ API Endpoints for Natural Language to SQL Query System
 This module contains Flask endpoints that call backend helper functions.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException
 from flask_cors import CORS
-from backend import create_query_processor, QueryProcessor
+from backend import create_query_processor, QueryProcessor, QueryTimeoutError
+from mysql.connector import Error as MySQLError
+from semantic_cache import SemanticResponseCache
+import orjson
 import os
-from typing import Dict, Any
+import threading
+import time
+import zlib
+from typing import Dict, Any, Iterator, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd encoding disabled
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # br encoding disabled
+    brotli = None
+
+
+def _json_default(value: Any) -> Any:
+    """Coerce values orjson cannot serialize natively (DECIMAL -> exact string, TIME, etc.)."""
+    return str(value)
+
+
+class OrJSONProvider(JSONProvider):
+    """Serve jsonify and request.get_json through orjson."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(
+            obj, option=orjson.OPT_SERIALIZE_NUMPY, default=_json_default
+        ).decode()
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+def _encode_json(payload: Dict[str, Any]) -> bytes:
+    """Encode a response payload straight to orjson bytes (used for large result payloads)."""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY, default=_json_default)
+
+
+def _stream_query_rows(sql_query: str, batches) -> Iterator[bytes]:
+    """
+    Write {"sql_query", "data", "row_count"} incrementally, one row batch at a time.
+
+    The 200 status is already sent once rows flow, so a fetch that fails midway
+    (lost connection, max_execution_time) closes the array and adds an "error"
+    member: the body stays valid JSON and "data" holds only the rows read so far.
+    """
+    yield b'{"sql_query":' + orjson.dumps(sql_query) + b',"data":['
+    row_count = 0
+    error = None
+    try:
+        for batch in batches:
+            if row_count:
+                yield b","
+            # strip the list brackets so batches join into one array
+            yield orjson.dumps(batch, option=orjson.OPT_SERIALIZE_NUMPY, default=_json_default)[1:-1]
+            row_count += len(batch)
+    except MySQLError as e:
+        error = f"Query failed while streaming results: {e}"
+    except Exception as e:
+        app.logger.exception(e)
+        error = "Query failed while streaming results"
+    tail = b'],"row_count":' + str(row_count).encode()
+    if error:
+        tail += b',"error":' + orjson.dumps(error)
+    yield tail + b"}"
+
+
+# /health bodies are constant apart from the initialized flag; encode both once
+_HEALTH_BODIES = {
+    initialized: orjson.dumps({
+        "status": "healthy",
+        "message": "API is running",
+        "query_processor_initialized": initialized
+    })
+    for initialized in (True, False)
+}
+
+
+# Static error bodies, encoded once; each use still gets a fresh Response for CORS headers
+_ERR_NO_PROCESSOR = (orjson.dumps({"error": "Query processor not initialized. Please check configuration."}), 500)
+_ERR_NO_BODY = (orjson.dumps({"error": "Request body is required"}), 400)
+_ERR_BODY_NOT_OBJECT = (orjson.dumps({"error": "Request body must be a JSON object"}), 400)
+_ERR_NO_QUERY = (orjson.dumps({"error": "Query parameter is required in request body"}), 400)
+_ERR_NO_SQL = (orjson.dumps({"error": "SQL parameter is required in request body"}), 400)
+_ERR_NOT_SELECT = (orjson.dumps({"error": "Only SELECT queries are allowed"}), 400)
+_ERR_NO_SESSION_ID = (orjson.dumps({"error": "Session ID is required"}), 400)
+_ERR_BAD_PAGE = (orjson.dumps({"error": "limit and offset must be integers"}), 400)
+_ERR_INTERNAL = (orjson.dumps({"error": "Internal server error"}), 500)
+_ERR_NOT_FOUND = (orjson.dumps({
+    "error": "Endpoint not found",
+    "available_endpoints": [
+        "GET /health",
+        "POST /query",
+        "POST /query/sql",
+        "GET /memory/sessions",
+        "GET /memory/<session_id>"
+    ]
+}), 404)
+
+
+def _static_error(error) -> Response:
+    """Wrap a pre-encoded (body, status) error constant in a Response."""
+    body, status = error
+    return Response(body, status=status, mimetype="application/json")
+
+
+class APIError(Exception):
+    """Request failure with a caller-facing JSON payload (rendered by the APIError handler)."""
+
+    def __init__(self, status: int, payload: Dict[str, Any]):
+        super().__init__(payload.get("error"))
+        self.status = status
+        self.payload = payload
+
+
+def _json_body() -> Any:
+    """Parse the raw request body with orjson; None when it is empty or not valid JSON."""
+    raw = request.get_data(cache=False)
+    if not raw:
+        return None
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+
+
+# Bodies smaller than this go out uncompressed (not worth the CPU or the header)
+COMPRESS_MIN_BYTES = 1024
+# Fast levels: responses are compressed on the request thread
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+
+# zstd compressors are not thread-safe, so each request thread reuses its own
+_zstd_local = threading.local()
+
+
+def _zstd_compressor():
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor
+
+
+def _gzip_stream():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+# Content-Encoding -> (one-shot compress, streaming compressor factory), in server preference
+_ENCODERS = {}
+if zstandard is not None:
+    _ENCODERS["zstd"] = (
+        lambda body: _zstd_compressor().compress(body),
+        lambda: _zstd_compressor().compressobj(),
+    )
+if brotli is not None:
+    _ENCODERS["br"] = (
+        lambda body: brotli.compress(body, quality=BROTLI_QUALITY),
+        lambda: brotli.Compressor(quality=BROTLI_QUALITY),
+    )
+_ENCODERS["gzip"] = (
+    lambda body: zlib.compress(body, GZIP_LEVEL, wbits=16 + zlib.MAX_WBITS),
+    _gzip_stream,
+)
+
+
+def _compress_stream(chunks: Iterator[bytes], compressor) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk (zlib/zstd objects and brotli.Compressor)."""
+    if hasattr(compressor, "process"):  # brotli
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
 
 app = Flask(__name__)
+app.json = OrJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+
+@app.after_request
+def compress_response(response: Response) -> Response:
+    """Compress JSON responses with the best encoding the client accepts (zstd, br, gzip)."""
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.mimetype != "application/json"
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(list(_ENCODERS))
+    if not encoding:
+        return response
+
+    compress, stream_compressor = _ENCODERS[encoding]
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, stream_compressor())
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress(body))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
 # Global query processor instance
 query_processor: QueryProcessor = None
 
+# Encoded /query responses reused for near-identical questions within a session
+response_cache: SemanticResponseCache = None
+
+# Soft per-query budget, checked between pipeline steps (SQL generation, execution,
+# analysis). It does not cancel an LLM or database call that is already running, so a
+# query can overrun it by one step; past it, the client gets a 504 and the turn is
+# not saved to memory.
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "110"))
+
+
+_TRUE_STRINGS = frozenset({"true", "1", "yes", "y", "on"})
+
 
 def parse_bool(value, default: bool = False) -> bool:
     """Utility to parse booleans from various payload formats."""
     if value is None:
         return default
-    if isinstance(value, bool):
+    if type(value) is bool:
         return value
     if isinstance(value, str):
-        return value.strip().lower() in {"true", "1", "yes", "y", "on"}
+        # exact match first; only normalize padded/mixed-case input
+        return value in _TRUE_STRINGS or value.strip().lower() in _TRUE_STRINGS
     if isinstance(value, (int, float)):
         return value != 0
     return bool(value)
 
 
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+def parse_page_args() -> Tuple[int, int]:
+    """Read ?limit=&offset= from the query string (limit clamped to 1..MAX_PAGE_LIMIT)."""
+    limit = int(request.args.get("limit", DEFAULT_PAGE_LIMIT))
+    offset = int(request.args.get("offset", 0))
+    return min(max(limit, 1), MAX_PAGE_LIMIT), max(offset, 0)
+
+
+def _not_modified(etag: str) -> bool:
+    """True when the client's If-None-Match already covers this (weak) ETag."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def _with_etag(response: Response, etag: str) -> Response:
+    response.set_etag(etag, weak=True)
+    return response
+
+
 def init_app():
     """Initialize the Flask application and create query processor."""
-    global query_processor
+    global query_processor, response_cache
     try:
         query_processor = create_query_processor()
         print("Query processor initialized successfully")
+        if parse_bool(os.getenv("SEMANTIC_CACHE_ENABLED"), True):
+            response_cache = SemanticResponseCache(
+                query_processor.memory.dimension,
+                similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "600")),
+            )
     except Exception as e:
         print(f"Error initializing query processor: {e}")
         query_processor = None
@@ -48,11 +299,8 @@ def health_check():
     Returns:
         JSON response with health status
     """
-    return jsonify({
-        "status": "healthy",
-        "message": "API is running",
-        "query_processor_initialized": query_processor is not None
-    }), 200
+    # fresh Response per probe: after_request hooks (CORS) add headers to it
+    return Response(_HEALTH_BODIES[query_processor is not None], status=200, mimetype="application/json")
 
 
 @app.route('/query', methods=['POST'])
@@ -65,7 +313,8 @@ def process_natural_language_query():
             "query": "natural language query string",
             "session_id": "optional-session-identifier",
             "reset_session": false,
-            "include_memory_context": true
+            "include_memory_context": true,
+            "bypass_cache": false
         }
     
     Returns:
@@ -80,64 +329,110 @@ def process_natural_language_query():
             - error: Error message if any
     """
     if not query_processor:
-        return jsonify({
-            "error": "Query processor not initialized. Please check configuration."
-        }), 500
+        return _static_error(_ERR_NO_PROCESSOR)
     
+    # Get request data
+    data = _json_body()
+
+    if not data:
+        return _static_error(_ERR_NO_BODY)
+    if not isinstance(data, dict):
+        return _static_error(_ERR_BODY_NOT_OBJECT)
+
+    query = data.get('query')
+    if not query:
+        return _static_error(_ERR_NO_QUERY)
+
+    session_id = data.get("session_id")
+    reset_session = parse_bool(data.get("reset_session"), False)
+    include_memory = parse_bool(data.get("include_memory_context"), True)
+    bypass_cache = parse_bool(data.get("bypass_cache"), False)
+
+    # Semantic cache: only for caller-supplied sessions, since fresh ones have no history
+    cache_key = None
+    query_embedding = None
+    if response_cache and session_id:
+        if reset_session:
+            response_cache.invalidate(session_id)
+        try:
+            cache_key = (session_id, include_memory)
+            query_embedding = query_processor.memory.embed_query(query)
+            recent = query_processor.memory.recent_queries(
+                session_id, response_cache.context_turns
+            )
+            if not (bypass_cache or reset_session):
+                cached_body = response_cache.get(cache_key, query_embedding, recent)
+                if cached_body is not None:
+                    return Response(cached_body, status=200, mimetype="application/json")
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            cache_key = None
+            query_embedding = None
+
+    # Process the query (concurrency is bounded by the server's request threads)
     try:
-        # Get request data
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                "error": "Request body is required"
-            }), 400
-        
-        query = data.get('query')
-        if not query:
-            return jsonify({
-                "error": "Query parameter is required in request body"
-            }), 400
-
-        session_id = data.get("session_id")
-        reset_session = parse_bool(data.get("reset_session"), False)
-        include_memory = parse_bool(data.get("include_memory_context"), True)
-        
-        # Process the query
         result = query_processor.process_query(
             query,
             session_id=session_id,
             reset_session=reset_session,
+            bypass_cache=bypass_cache,
+            deadline=time.monotonic() + QUERY_TIMEOUT_SECONDS,
+            query_embedding=query_embedding,
         )
-        
-        # Check for errors
-        if result.get("error"):
-            return jsonify({
-                "error": result["error"],
-                "sql_query": result.get("sql_query"),
-                "session_id": result.get("session_id"),
-            }), 400
-        
+    except QueryTimeoutError:
+        raise APIError(504, {
+            "error": "Query processing timed out. Please try again.",
+            "session_id": session_id,
+        })
+
+    session_id, sql_query, rows, analysis, memory_context, memory_warning, error = result
+
+    # Check for errors
+    if error:
+        raise APIError(400, {
+            "error": error,
+            "sql_query": sql_query,
+            "session_id": session_id,
+        })
+
+    # one dict literal per response shape
+    row_count = len(rows) if rows else 0
+    if not include_memory:
+        response_payload = {
+            "session_id": session_id,
+            "sql_query": sql_query,
+            "data": rows,
+            "analysis": analysis,
+            "row_count": row_count,
+        }
+    elif memory_warning:
+        response_payload = {
+            "session_id": session_id,
+            "sql_query": sql_query,
+            "data": rows,
+            "analysis": analysis,
+            "row_count": row_count,
+            "memory_context": memory_context,
+            "memory_warning": memory_warning,
+        }
+    else:
         response_payload = {
-            "session_id": result.get("session_id"),
-            "sql_query": result["sql_query"],
-            "data": result["data"],
-            "analysis": result["analysis"],
-            "row_count": len(result["data"]) if result["data"] else 0,
+            "session_id": session_id,
+            "sql_query": sql_query,
+            "data": rows,
+            "analysis": analysis,
+            "row_count": row_count,
+            "memory_context": memory_context,
         }
 
-        if include_memory:
-            response_payload["memory_context"] = result.get("memory_context", [])
-            if result.get("memory_warning"):
-                response_payload["memory_warning"] = result.get("memory_warning")
-        
-        # Return success response
-        return jsonify(response_payload), 200
-        
-    except Exception as e:
-        return jsonify({
-            "error": f"Internal server error: {str(e)}"
-        }), 500
+    # Return success response
+    body = _encode_json(response_payload)
+    if cache_key is not None:
+        # a reset session starts from an empty history
+        response_cache.set(
+            cache_key, query_embedding, query, [] if reset_session else recent, body
+        )
+    return Response(body, status=200, mimetype="application/json")
 
 
 @app.route('/query/sql', methods=['POST'])
@@ -155,138 +450,147 @@ def execute_sql_query():
         JSON response containing query results
     """
     if not query_processor:
-        return jsonify({
-            "error": "Query processor not initialized. Please check configuration."
-        }), 500
+        return _static_error(_ERR_NO_PROCESSOR)
     
-    try:
-        # Get request data
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                "error": "Request body is required"
-            }), 400
-        
-        sql_query = data.get('sql')
-        if not sql_query:
-            return jsonify({
-                "error": "SQL parameter is required in request body"
-            }), 400
-        
-        # Ensure it's a SELECT query for safety
-        if not sql_query.strip().upper().startswith('SELECT'):
-            return jsonify({
-                "error": "Only SELECT queries are allowed"
-            }), 400
-        
-        # Execute the query
-        query_results, error = query_processor.db.execute_query(sql_query)
-        
-        if error:
-            return jsonify({
-                "error": error,
-                "sql_query": sql_query
-            }), 400
-        
-        # Return success response
-        return jsonify({
-            "sql_query": sql_query,
-            "data": query_results,
-            "row_count": len(query_results) if query_results else 0
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            "error": f"Internal server error: {str(e)}"
-        }), 500
+    # Get request data
+    data = _json_body()
+
+    if not data:
+        return _static_error(_ERR_NO_BODY)
+    if not isinstance(data, dict):
+        return _static_error(_ERR_BODY_NOT_OBJECT)
+
+    sql_query = data.get('sql')
+    if not sql_query:
+        return _static_error(_ERR_NO_SQL)
+
+    # Ensure it's a SELECT query for safety (only the leading keyword is inspected)
+    if sql_query.lstrip()[:6].lower() != 'select':
+        return _static_error(_ERR_NOT_SELECT)
+
+    # Execute the query; rows are fetched as the response is written
+    batches, error = query_processor.db.iter_query(sql_query)
+
+    if error:
+        raise APIError(400, {
+            "error": error,
+            "sql_query": sql_query
+        })
+
+    # Return success response (streamed); releases the DB connection even if the client disconnects early
+    response = Response(_stream_query_rows(sql_query, batches), mimetype="application/json")
+    response.call_on_close(batches.close)
+    return response
 
 
 @app.route('/memory/sessions', methods=['GET'])
 def list_memory_sessions():
-    """List available memory sessions."""
+    """List available memory sessions (paginated with ?limit=&offset=)."""
     if not query_processor:
-        return jsonify({
-            "error": "Query processor not initialized. Please check configuration."
-        }), 500
+        return _static_error(_ERR_NO_PROCESSOR)
 
     try:
-        sessions = query_processor.memory.list_sessions()
-        return jsonify({
-            "sessions": sessions,
-            "count": len(sessions)
-        }), 200
-    except Exception as e:
-        return jsonify({
-            "error": f"Unable to retrieve memory sessions: {str(e)}"
-        }), 500
+        limit, offset = parse_page_args()
+    except ValueError:
+        return _static_error(_ERR_BAD_PAGE)
+
+    etag = f"sessions-{query_processor.memory.version()}-{limit}-{offset}"
+    if _not_modified(etag):
+        return _with_etag(Response(status=304), etag)
+
+    # one extra row tells us whether another page exists
+    sessions = query_processor.memory.list_sessions(limit=limit + 1, offset=offset)
+    has_more = len(sessions) > limit
+    sessions = sessions[:limit]
+    return _with_etag(jsonify({
+        "sessions": sessions,
+        "count": len(sessions),
+        "offset": offset,
+        "next_offset": offset + len(sessions) if has_more else None,
+        "has_more": has_more
+    }), etag), 200
 
 
 @app.route('/memory/<session_id>', methods=['GET'])
 def get_session_memory(session_id: str):
-    """Retrieve stored memory for a specific session."""
+    """Retrieve stored memory for a specific session (paginated with ?limit=&offset=)."""
     if not query_processor:
-        return jsonify({
-            "error": "Query processor not initialized. Please check configuration."
-        }), 500
+        return _static_error(_ERR_NO_PROCESSOR)
 
     if not session_id:
-        return jsonify({
-            "error": "Session ID is required"
-        }), 400
+        return _static_error(_ERR_NO_SESSION_ID)
 
     try:
-        history = query_processor.memory.get_session_history(session_id)
-        if not history:
-            return jsonify({
-                "session_id": session_id,
-                "entries": [],
-                "message": "No memory found for the specified session."
-            }), 404
+        limit, offset = parse_page_args()
+    except ValueError:
+        return _static_error(_ERR_BAD_PAGE)
+
+    # the URL already scopes the tag to the session (ids may hold characters ETags cannot)
+    etag = f"{query_processor.memory.version(session_id)}-{limit}-{offset}"
+    if _not_modified(etag):
+        return _with_etag(Response(status=304), etag)
 
+    history = query_processor.memory.get_session_history(
+        session_id, limit=limit + 1, offset=offset
+    )
+    has_more = len(history) > limit
+    history = history[:limit]
+    if not history and offset == 0:
         return jsonify({
             "session_id": session_id,
-            "entries": history,
-            "count": len(history)
-        }), 200
-    except Exception as e:
-        return jsonify({
-            "error": f"Unable to retrieve session memory: {str(e)}"
-        }), 500
+            "entries": [],
+            "message": "No memory found for the specified session."
+        }), 404
+
+    return _with_etag(jsonify({
+        "session_id": session_id,
+        "entries": history,
+        "count": len(history),
+        "offset": offset,
+        "next_offset": offset + len(history) if has_more else None,
+        "has_more": has_more
+    }), etag), 200
 
 
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
-    return jsonify({
-        "error": "Endpoint not found",
-        "available_endpoints": [
-            "GET /health",
-            "POST /query",
-            "POST /query/sql",
-            "GET /memory/sessions",
-            "GET /memory/<session_id>"
-        ]
-    }), 404
+    return _static_error(_ERR_NOT_FOUND)
+
+
+@app.errorhandler(APIError)
+def api_error(error: APIError):
+    """Render an APIError's payload."""
+    return Response(_encode_json(error.payload), status=error.status, mimetype="application/json")
 
 
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors."""
-    return jsonify({
-        "error": "Internal server error",
-        "message": str(error)
-    }), 500
+    return _static_error(_ERR_INTERNAL)
+
+
+@app.errorhandler(Exception)
+def unhandled_error(error: Exception):
+    """Log any uncaught exception and return a generic 500 (details stay in the server log)."""
+    if isinstance(error, HTTPException):
+        # same JSON shape as other errors; keeps werkzeug's headers (e.g. Allow on 405)
+        response = error.get_response()
+        response.set_data(orjson.dumps({"error": error.description}))
+        response.mimetype = "application/json"
+        return response
+    app.logger.exception(error)
+    return _static_error(_ERR_INTERNAL)
 
 
 if __name__ == '__main__':
-    # Initialize the application
+    # Local development only; production runs under gunicorn (see gunicorn.conf.py)
     init_app()
     
     # Get port from environment variable or use default
     port = int(os.getenv("PORT", 5000))
     
     # Run the Flask application
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
 
 
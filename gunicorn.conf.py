@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for serving the API in production.
+Usage: gunicorn -c gunicorn.conf.py endpoints:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# One process by default: the conversation memory store (FAISS index + JSON Lines log)
+# is a single-writer file store. Threads keep slow LLM calls from blocking other requests.
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+# Each thread runs one request end to end, so this also caps concurrent /query pipelines
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# Worker heartbeat: with gthread the main loop notifies the arbiter while requests run on
+# their threads, so this restarts a hung worker process; it does not limit any one request
+# (see QUERY_TIMEOUT_SECONDS in endpoints.py for the per-query budget)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def post_worker_init(worker):
+    """Create the query processor inside each worker process."""
+    from endpoints import init_app
+    init_app()
@@ -0,0 +1,158 @@
+"""
+Semantic Response Cache Module
+Serves repeated /query requests from encoded responses keyed by session,
+conversation context and query embedding, so near-duplicate questions skip
+the LLM round trips entirely.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_CONTEXT_TURNS = 3
+DEFAULT_TTL_SECONDS = 600
+MAX_SESSIONS = 1024
+MAX_ENTRIES_PER_SESSION = 64
+
+
+def context_digest(queries: Sequence[str]) -> str:
+    """Hash a chain of conversation turns (oldest first)."""
+    return hashlib.md5("\x1f".join(queries).encode("utf-8")).hexdigest()
+
+
+class _SessionEntries:
+    """Flat inner-product index plus the cached responses for one session."""
+
+    def __init__(self, dimension: int):
+        self.index = faiss.IndexFlatIP(dimension)
+        self.queries: List[str] = []
+        self.contexts: List[tuple] = []
+        self.bodies: List[bytes] = []
+        self.expires_at: List[float] = []
+
+    def drop_oldest(self):
+        self.index.remove_ids(np.array([0], dtype="int64"))
+        del self.queries[0], self.contexts[0], self.bodies[0], self.expires_at[0]
+
+
+class SemanticResponseCache:
+    """
+    In-process cache of encoded /query responses.
+
+    Entries are partitioned by session so a follow-up such as "change it to last
+    year" never matches the same words asked in another conversation. A hit also
+    requires the conversation context chain to agree: the session's last turns
+    must equal the ones seen when the entry was stored, or be those turns followed
+    by the cached question itself (the user simply repeating the previous turn).
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        context_turns: int = DEFAULT_CONTEXT_TURNS,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            dimension: Size of the (L2-normalized) query embeddings
+            similarity_threshold: Minimum cosine similarity for a hit
+            context_turns: Number of previous session turns hashed into the context chain
+            ttl_seconds: How long a cached response stays valid
+        """
+        self.dimension = dimension
+        self.similarity_threshold = similarity_threshold
+        self.context_turns = context_turns
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[Tuple[str, bool], _SessionEntries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        partition: Tuple[str, bool],
+        embedding: np.ndarray,
+        recent_queries: List[str],
+    ) -> Optional[bytes]:
+        """
+        Look up a cached response body.
+
+        Args:
+            partition: (session_id, include_memory_context) pair the response was built for
+            embedding: Normalized query embedding
+            recent_queries: The session's last turns, oldest first
+
+        Returns:
+            Encoded response body on a hit, otherwise None
+        """
+        current = context_digest(recent_queries[-self.context_turns:])
+        vector = np.asarray(embedding, dtype="float32").reshape(1, -1)
+        with self._lock:
+            entries = self._sessions.get(partition)
+            if entries is None or not entries.queries:
+                return None
+            self._sessions.move_to_end(partition)
+            scores, positions = entries.index.search(vector, len(entries.queries))
+            now = time.monotonic()
+            for score, pos in zip(scores[0], positions[0]):
+                if score < self.similarity_threshold:
+                    break
+                if pos < 0 or entries.expires_at[pos] < now:
+                    continue
+                if current in entries.contexts[pos]:
+                    return entries.bodies[pos]
+        return None
+
+    def set(
+        self,
+        partition: Tuple[str, bool],
+        embedding: np.ndarray,
+        query: str,
+        recent_queries: List[str],
+        body: bytes,
+    ):
+        """
+        Store an encoded response body.
+
+        Args:
+            partition: (session_id, include_memory_context) pair the response was built for
+            embedding: Normalized query embedding
+            query: The natural language query that produced the response
+            recent_queries: The session's last turns before this query, oldest first
+            body: Encoded response body
+        """
+        turns = recent_queries[-self.context_turns:]
+        contexts = (
+            context_digest(turns),
+            context_digest((turns + [query])[-self.context_turns:]),
+        )
+        vector = np.asarray(embedding, dtype="float32").reshape(1, -1)
+        with self._lock:
+            entries = self._sessions.get(partition)
+            if entries is None:
+                entries = self._sessions[partition] = _SessionEntries(self.dimension)
+                if len(self._sessions) > MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(partition)
+            if len(entries.queries) >= MAX_ENTRIES_PER_SESSION:
+                entries.drop_oldest()
+            entries.index.add(vector)
+            entries.queries.append(query)
+            entries.contexts.append(contexts)
+            entries.bodies.append(body)
+            entries.expires_at.append(time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, session_id: str):
+        """Drop every cached response for a session (e.g. after a memory reset)."""
+        with self._lock:
+            for partition in [p for p in self._sessions if p[0] == session_id]:
+                del self._sessions[partition]